@@ -1,60 +1,144 @@
-# agents/calendar_agent.py
-"""
-CalendarAgent: simple scheduler storing events in-memory and persisted file.
-Provides get_due_events(simulate_now=True) for demo.
-"""
-
-import json
-from datetime import datetime, time
-from dateutil import parser as dateparser
-import os
-
-class CalendarAgent:
-    def __init__(self, memory=None, logger=None, store_path=None):
-        base = os.path.dirname(os.path.dirname(__file__))
-        self.store_path = store_path or os.path.join(base, "memory", "schedule_store.json")
-        self.memory = memory
-        self.logger = logger
-        self._load_store()
-
-    def _load_store(self):
-        try:
-            with open(self.store_path, "r") as f:
-                self.store = json.load(f)
-        except Exception:
-            self.store = {}
-
-    def _save_store(self):
-        with open(self.store_path, "w") as f:
-            json.dump(self.store, f, indent=2)
-
-    def schedule_user_meds(self, user_id, meds):
-        """
-        meds: list of {name, dose, time (HH:MM)}
-        """
-        self.store.setdefault(user_id, [])
-        for m in meds:
-            ev = {
-                "id": f"{user_id}-{m['name']}-{m['time']}",
-                "med": m['name'],
-                "dose": m.get("dose"),
-                "time": m.get("time")
-            }
-            self.store[user_id].append(ev)
-        self._save_store()
-        if self.logger:
-            self.logger.info({"event":"schedule_user_meds","user":user_id,"count":len(meds)})
-
-    def get_due_events(self, user_id=None, simulate_now=True):
-        """
-        Returns events that are due now. simulate_now returns all events to demo flow.
-        """
-        if simulate_now:
-            events = []
-            for u, evs in self.store.items():
-                for e in evs:
-                    events.append({"user_id": u, **e})
-            return events
-        # Real-time implementation would compare times and return matches.
-        return []
-
+# agents/calendar_agent.py
+"""
+CalendarAgent: simple scheduler storing events in-memory and persisted file.
+Events are persisted to an append-only JSONL log (one event per line), so
+scheduling costs O(event) instead of rewriting the whole store; compact()
+rewrites the log from the in-memory state. Provides
+get_due_events(simulate_now=True) for demo.
+"""
+
+import json
+from datetime import datetime
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _dumps_line(obj):
+    if orjson is not None:
+        return orjson.dumps(obj) + b"\n"
+    return (json.dumps(obj, separators=(",", ":")) + "\n").encode()
+
+
+def _loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class CalendarAgent:
+    def __init__(self, memory=None, logger=None, store_path=None):
+        base = os.path.dirname(os.path.dirname(__file__))
+        self.store_path = store_path or os.path.join(base, "memory", "schedule_store.jsonl")
+        self.memory = memory
+        self.logger = logger
+        self._fh = None  # append handle, opened on first write
+        self._load_store()
+
+    def _load_store(self):
+        self.store = {}
+        path = self.store_path
+        if not os.path.exists(path):
+            # migrate a legacy whole-store JSON snapshot if one is present
+            legacy = os.path.splitext(path)[0] + ".json"
+            if os.path.exists(legacy):
+                try:
+                    with open(legacy, "rb") as f:
+                        data = _loads(f.read())
+                    if isinstance(data, dict):
+                        self.store = {
+                            u: [{"user_id": u, **ev} for ev in evs]
+                            for u, evs in data.items()
+                        }
+                    self.compact()
+                except Exception:
+                    self.store = {}
+            return
+        try:
+            with open(path, "rb") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        ev = _loads(line)
+                    except Exception:
+                        continue
+                    user_id = ev.get("user_id")
+                    if user_id is not None:
+                        self.store.setdefault(user_id, []).append(ev)
+        except Exception:
+            self.store = {}
+
+    def _append_events(self, events):
+        if self._fh is None:
+            self._fh = open(self.store_path, "ab")
+        for ev in events:
+            self._fh.write(_dumps_line(ev))
+        self._fh.flush()
+
+    def compact(self):
+        """
+        Atomically rewrite the log to one line per live event. Useful after
+        many appends or to migrate a legacy snapshot.
+        """
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        tmp = self.store_path + ".tmp"
+        with open(tmp, "wb") as f:
+            for evs in self.store.values():
+                for ev in evs:
+                    f.write(_dumps_line(ev))
+        os.replace(tmp, self.store_path)
+
+    def schedule_user_meds(self, user_id, meds):
+        """
+        meds: list of {name, dose, time (HH:MM)}
+        """
+        self.store.setdefault(user_id, [])
+        new_events = []
+        for m in meds:
+            ev = {
+                "id": f"{user_id}-{m['name']}-{m['time']}",
+                "user_id": user_id,
+                "med": m['name'],
+                "dose": m.get("dose"),
+                "time": m.get("time")
+            }
+            self.store[user_id].append(ev)
+            new_events.append(ev)
+        self._append_events(new_events)
+        if self.logger:
+            self.logger.info({"event":"schedule_user_meds","user":user_id,"count":len(meds)})
+
+    def get_due_events(self, user_id=None, simulate_now=True):
+        """
+        Returns events that are due now. simulate_now returns all events to demo flow.
+        """
+        if simulate_now:
+            # events carry user_id since insert time, so no per-event merge
+            return [e for evs in self.store.values() for e in evs]
+        # Real-time: match events whose HH:MM equals the current minute.
+        # Schedule times are a fixed format, so strptime beats a general
+        # date parser here.
+        now = datetime.now()
+        if user_id is not None:
+            candidates = self.store.get(user_id, [])
+        else:
+            candidates = [e for evs in self.store.values() for e in evs]
+        due = []
+        for e in candidates:
+            t = e.get("time")
+            if not t:
+                continue
+            try:
+                parsed = datetime.strptime(t, "%H:%M")
+            except ValueError:
+                continue
+            if parsed.hour == now.hour and parsed.minute == now.minute:
+                due.append(e)
+        return due
@@ -1,348 +1,497 @@
-# agents/convo_agent.py
-"""
-ConversationalAgent: Gemini wrapper + memory-first responder for the Medication Buddy demo.
-
-Features:
-- memory-first responses (search + summarize)
-- robust Gemini wrapper with safe fallbacks and truncation handling
-- upload document processing -> suggested specialties
-- send_reminder_and_record demo flow (simulated user reply)
-- doctor mode to add advice to patient memory
-- small helper getters for recent adherence events
-"""
-
-from dotenv import load_dotenv
-load_dotenv()
-
-import os
-import json
-import time
-import requests
-import re
-from typing import List, Dict, Any, Optional
-
-from memory.memory_bank import MemoryBank
-from logs.json_logger import JSONLogger
-from tools.medcheck_tool import medcheck
-from tools.docs_processor import extract_keywords
-
-DEFAULT_MAX_OUTPUT_TOKENS = 512  # conservative default; raise if you need longer model replies
-
-
-class ConversationalAgent:
-    def __init__(self, memory: Optional[MemoryBank] = None, logger: Optional[JSONLogger] = None):
-        # Config / environment
-        self.GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-        # endpoint base (no trailing /models), we'll append model path
-        self.GEMINI_ENDPOINT = os.getenv("GEMINI_ENDPOINT", "https://generativelanguage.googleapis.com/v1beta")
-        self.GEMINI_MODEL = os.getenv("GEMINI_MODEL", "models/gemini-2.5-pro")
-
-        # runtime helpers
-        self.memory = memory or MemoryBank("memory/memory_bank.json")
-        self.logger = logger
-
-    # -----------------------
-    # Gemini API wrapper
-    # -----------------------
-    def call_gemini(self, prompt: str, max_output_tokens: int = DEFAULT_MAX_OUTPUT_TOKENS, temperature: float = 0.2) -> str:
-        """
-        Call Gemini generateContent for configured model.
-        Returns a string (model output) or a deterministic fallback message on error.
-        """
-        if not self.GEMINI_API_KEY:
-            return "SIMULATED MODEL RESPONSE: " + (prompt[:200] + "...")
-
-        base = self.GEMINI_ENDPOINT.rstrip("/")
-        model = getattr(self, "GEMINI_MODEL", "models/gemini-2.5-pro")
-        url = f"{base}/{model}:generateContent"
-
-        headers = {
-            "Content-Type": "application/json",
-            "x-goog-api-key": self.GEMINI_API_KEY
-        }
-
-        payload = {
-            "contents": [{"parts": [{"text": prompt}]}],
-            "generationConfig": {
-                "temperature": temperature,
-                "maxOutputTokens": max_output_tokens,
-                "candidateCount": 1
-            }
-        }
-
-        try:
-            resp = requests.post(url, headers=headers, json=payload, timeout=60)
-        except Exception as e:
-            if self.logger:
-                self.logger.error({"agent": "convo", "action": "call_gemini_request_failed", "error": str(e)})
-            return "SIMULATED MODEL RESPONSE (request error)."
-
-        # parse response safely
-        body_json = None
-        body_text = ""
-        try:
-            body_json = resp.json()
-        except Exception:
-            body_text = resp.text or ""
-
-        if self.logger:
-            self.logger.info({
-                "agent": "convo",
-                "action": "call_gemini_response",
-                "status": resp.status_code,
-                "body": str(body_json)[:4000] if body_json else body_text[:2000]
-            })
-
-        if resp.status_code != 200 or not body_json:
-            if self.logger:
-                self.logger.error({
-                    "agent": "convo",
-                    "action": "call_gemini_non200",
-                    "status": resp.status_code,
-                    "body": str(body_json)[:2000] if body_json else body_text[:2000]
-                })
-            return "SIMULATED MODEL RESPONSE (API error). See logs."
-
-        # helper to extract model text from known response shapes
-        def extract_text(d: Dict[str, Any]) -> Optional[str]:
-            try:
-                candidates = d.get("candidates") or []
-                if candidates:
-                    c0 = candidates[0]
-                    content = c0.get("content") or {}
-                    parts = content.get("parts") or []
-                    if parts:
-                        first = parts[0]
-                        if isinstance(first, dict) and "text" in first:
-                            return first["text"]
-                        if isinstance(first, str):
-                            return first
-                    if isinstance(c0.get("output"), str):
-                        return c0.get("output")
-                if "output_text" in d and isinstance(d["output_text"], str):
-                    return d["output_text"]
-                if "messages" in d:
-                    texts = []
-                    for m in d.get("messages", []):
-                        for c in (m.get("content") or []):
-                            if isinstance(c, dict) and "text" in c:
-                                texts.append(c["text"])
-                    if texts:
-                        return "\n".join(texts)
-            except Exception:
-                return None
-            return None
-
-        out = extract_text(body_json)
-
-        # detect truncation metadata (finishReason == MAX_TOKENS)
-        try:
-            cand0 = (body_json.get("candidates") or [None])[0]
-            if cand0 and isinstance(cand0, dict) and cand0.get("finishReason") == "MAX_TOKENS":
-                if out:
-                    return out + "\n\n---\n(Note: model truncated by MAX_TOKENS; consider raising max_output_tokens)"
-                else:
-                    if self.logger:
-                        self.logger.info({"agent": "convo", "action": "model_truncated_candidate", "candidate": json.dumps(cand0)[:2000]})
-                    return "MODEL_TRUNCATED: Increase max_output_tokens. Partial candidate logged."
-        except Exception:
-            pass
-
-        if out:
-            return out
-
-        if self.logger:
-            self.logger.error({"agent": "convo", "action": "call_gemini_unparseable", "body": str(body_json)[:2000]})
-        return "SIMULATED MODEL RESPONSE (unparseable). See logs."
-
-    # -----------------------
-    # Memory helpers
-    # -----------------------
-    def search_memory(self, user_id: str, query: str, max_results: int = 10) -> List[Dict[str, Any]]:
-        """
-        Very simple keyword search across JSON-serializable events.
-        Returns matches (newest first) where any token appears in the JSON string of the event.
-        """
-        events = self.memory.get_user_memory(user_id)
-        if not events:
-            return []
-        q_tokens = [t.lower() for t in re.findall(r"\w+", query) if len(t) > 2][:10]
-        if not q_tokens:
-            return []
-        matches: List[Dict[str, Any]] = []
-        for ev in reversed(events):  # newest first
-            s = json.dumps(ev).lower()
-            for t in q_tokens:
-                if t in s:
-                    matches.append(ev)
-                    break
-            if len(matches) >= max_results:
-                break
-        return matches
-
-    def summarize_events(self, events: List[Dict[str, Any]], concise: bool = True) -> str:
-        """
-        Local summarization of events into readable bullets. If many events and concise=False,
-        optionally call model to compress further.
-        """
-        if not events:
-            return ""
-        bullets: List[str] = []
-        for ev in events:
-            tp = ev.get("type", "event")
-            if tp == "adherence_event":
-                med = ev.get("med") or ev.get("med_name") or ""
-                ts = ev.get("timestamp") or ev.get("recorded_at") or ev.get("time") or ""
-                try:
-                    human_ts = time.strftime("%Y-%m-%d %H:%M", time.localtime(float(ts)))
-                except Exception:
-                    human_ts = str(ts)
-                bullets.append(f"- Took {med} at {human_ts}")
-            elif tp == "uploaded_doc_summary":
-                meds = ", ".join([k for k in ev.get("keywords", [])[:6]])
-                specs = ", ".join(ev.get("suggested_specialties", []))
-                bullets.append(f"- Uploaded doc keywords: {meds}. Suggested: {specs}")
-            elif tp == "doctor_advice":
-                adv = ev.get("advice_text", "")
-                doc = ev.get("doctor_id", "doctor")
-                bullets.append(f"- Doctor {doc} advised: {adv}")
-            else:
-                bullets.append(f"- {tp}: {str(ev)[:120]}")
-
-        summary = "\n".join(bullets[:20])
-        if len(bullets) > 20 and not concise:
-            # ask model to compress into 3 lines
-            prompt = "Summarize these patient events into 3 concise lines:\n\n" + summary
-            model_out = self.call_gemini(prompt, max_output_tokens=200)
-            return model_out or summary
-        return summary
-
-    # -----------------------
-    # Memory-first responder
-    # -----------------------
-    def respond_with_memory_first(self, user_id: str, query: str) -> str:
-        """
-        1) Search memory for matches to the query
-        2) If matches exist, return a short local summary and offer to expand
-        3) If none found, call Gemini directly
-        """
-        if self.logger:
-            self.logger.info({"agent": "convo", "action": "respond_with_memory_first", "user": user_id, "query": query})
-        matches = self.search_memory(user_id, query, max_results=8)
-        if matches:
-            summary = self.summarize_events(matches, concise=True)
-            if not summary.strip():
-                if self.logger:
-                    self.logger.info({"agent": "convo", "action": "empty_summary_fallback"})
-                return self.call_gemini(query)
-            return f"I found these saved notes related to your question:\n\n{summary}\n\nIf you want more details I can expand or ask the model to interpret these."
-        # nothing in memory
-        return self.call_gemini(query)
-
-    # -----------------------
-    # App features
-    # -----------------------
-    def send_reminder_and_record(self, user_id: str, event: Dict[str, Any]) -> Dict[str, Any]:
-        """
-        Sends a reminder prompt to the model, simulates user reply (demo), and logs adherence event.
-        event keys: 'med' or 'med_name', optionally 'dose'/'dosage', 'time', 'frequency'
-        """
-        med = event.get("med") or event.get("med_name") or "medication"
-        dose = event.get("dose") or event.get("dosage") or ""
-        prompt = f"Reminder: It's time to take {med} {dose}. Ask the user to confirm 'Did you take {med}?' and handle yes/no."
-        if self.logger:
-            self.logger.info({"agent": "convo", "action": "send_reminder", "user": user_id, "med": med})
-        model_resp = self.call_gemini(prompt)
-        # Demo: simulate user confirming
-        user_reply = "Yes, I took it."
-        timestamp = time.time()
-        entry = {
-            "type": "adherence_event",
-            "user_id": user_id,
-            "med": med,
-            "dose": dose,
-            "timestamp": timestamp,
-            "user_reply": user_reply,
-            "recorded_at": timestamp
-        }
-        self.memory.append_user_event(user_id, entry)
-        return {"model_response": model_resp, "user_reply": user_reply, "saved": True}
-
-    def handle_uploaded_document(self, user_id: str, doc_text: str) -> List[str]:
-        """
-        Process uploaded prescription/medical record text, extract keywords/conditions,
-        recommend specialties. Robust to model errors/truncation.
-        """
-        keywords = extract_keywords(doc_text)
-        specialty_map = {
-            "chest pain": ["Cardiology"],
-            "shortness of breath": ["Pulmonology", "Cardiology"],
-            "high blood pressure": ["Cardiology", "Internal Medicine"],
-            "diabetes": ["Endocrinology", "Internal Medicine"],
-            "elevated lipids": ["Cardiology", "Endocrinology"],
-            "fracture": ["Orthopedics"],
-            "skin rash": ["Dermatology"],
-            "abdominal pain": ["Gastroenterology"]
-        }
-
-        suggested = set()
-        # rule-based matching first
-        for kw in keywords:
-            for token, specs in specialty_map.items():
-                if token in kw.lower():
-                    suggested.update(specs)
-
-        if not suggested:
-            # fallback to the model to infer specialties
-            prompt = f"Given these extracted keywords from a medical record: {keywords[:20]}, suggest likely medical specialties a patient should visit."
-            model_suggestions = self.call_gemini(prompt, max_output_tokens=200)
-
-            # defensive checks for sentinel/error messages
-            ms_text = str(model_suggestions or "")
-            if not ms_text.strip() or any(sig in ms_text.upper() for sig in ("MODEL_TRUNCATED", "SIMULATED MODEL RESPONSE", "API ERROR", "UNPARSEABLE")):
-                if self.logger:
-                    self.logger.info({"agent": "convo", "action": "handle_uploaded_document_fallback", "user": user_id, "model_resp": ms_text[:500]})
-                suggested.update(["Primary Care", "Internal Medicine"])
-            else:
-                # parse sensible items by splitting common separators
-                parts = [p.strip() for p in re.split(r"[,\n;]+", ms_text) if len(p.strip()) > 2]
-                for p in parts[:6]:
-                    suggested.add(p)
-
-        summary_entry = {
-            "type": "uploaded_doc_summary",
-            "user_id": user_id,
-            "keywords": keywords,
-            "suggested_specialties": list(suggested),
-            "raw_excerpt": doc_text[:500],
-            "recorded_at": time.time()
-        }
-        self.memory.append_user_event(user_id, summary_entry)
-
-        if self.logger:
-            self.logger.info({"agent": "convo", "action": "doc_processed", "user": user_id, "specialties": list(suggested)})
-
-        return list(suggested)
-
-    def doctor_add_advice(self, user_id: str, doctor_id: str, advice_text: str, related_specialties: Optional[List[str]] = None) -> bool:
-        """
-        Doctor mode: add an advice note to patient memory.
-        """
-        note = {
-            "type": "doctor_advice",
-            "user_id": user_id,
-            "doctor_id": doctor_id,
-            "advice_text": advice_text,
-            "related_specialties": related_specialties or [],
-            "timestamp": time.time(),
-            "recorded_at": time.time()
-        }
-        self.memory.append_user_event(user_id, note)
-        if self.logger:
-            self.logger.info({"agent": "convo", "action": "doctor_add_advice", "user": user_id, "doctor_id": doctor_id})
-        return True
-
-    # convenience getter
-    def get_recent_adherence(self, user_id: str, n: int = 5) -> List[Dict[str, Any]]:
-        evs = list(reversed(self.memory.get_user_memory(user_id)))
-        return [e for e in evs if e.get("type") == "adherence_event"][:n]
+# agents/convo_agent.py
+"""
+ConversationalAgent: Gemini wrapper + memory-first responder for the Medication Buddy demo.
+
+Features:
+- memory-first responses (search + summarize)
+- robust Gemini wrapper with safe fallbacks and truncation handling
+- upload document processing -> suggested specialties
+- send_reminder_and_record demo flow (simulated user reply)
+- doctor mode to add advice to patient memory
+- small helper getters for recent adherence events
+"""
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+import functools
+import hashlib
+import json
+import time
+import requests
+import re
+from itertools import islice
+from typing import List, Dict, Any, Optional
+
+try:
+    import ahocorasick  # optional; speeds up multi-token memory search
+except ImportError:
+    ahocorasick = None
+
+from memory.memory_bank import MemoryBank
+from logs.json_logger import JSONLogger
+from tools.medcheck_tool import medcheck
+from tools.docs_processor import extract_keywords
+
+DEFAULT_MAX_OUTPUT_TOKENS = 512  # conservative default; raise if you need longer model replies
+GEMINI_CACHE_MAX = 512  # max cached (prompt, params) -> response entries
+
+# compiled once; these run on every query / document in the chat loop
+_WORD_RE = re.compile(r"\w+")
+_SPLIT_RE = re.compile(r"[,\n;]+")
+
+# condition trigger -> specialties to suggest, shared by document handling
+SPECIALTY_MAP = {
+    "chest pain": ["Cardiology"],
+    "shortness of breath": ["Pulmonology", "Cardiology"],
+    "high blood pressure": ["Cardiology", "Internal Medicine"],
+    "diabetes": ["Endocrinology", "Internal Medicine"],
+    "elevated lipids": ["Cardiology", "Endocrinology"],
+    "fracture": ["Orthopedics"],
+    "skin rash": ["Dermatology"],
+    "abdominal pain": ["Gastroenterology"]
+}
+
+# indicative terms per specialty for the local fallback classifier; a
+# keyword-token overlap score decides matches without a network call
+_SPECIALTY_TERMS = {
+    "Cardiology": frozenset({"chest", "heart", "cardiac", "lipid", "lipids", "cholesterol", "statin", "atorvastatin", "hypertension", "palpitations"}),
+    "Endocrinology": frozenset({"diabetes", "diabetic", "insulin", "metformin", "thyroid", "glucose", "a1c"}),
+    "Pulmonology": frozenset({"breath", "asthma", "cough", "copd", "wheezing", "inhaler"}),
+    "Orthopedics": frozenset({"fracture", "bone", "joint", "sprain"}),
+    "Dermatology": frozenset({"rash", "skin", "eczema", "acne"}),
+    "Gastroenterology": frozenset({"abdominal", "stomach", "nausea", "reflux", "bowel"}),
+    "Neurology": frozenset({"headache", "migraine", "seizure", "dizziness"}),
+    "Internal Medicine": frozenset({"fever", "fatigue", "blood", "pressure", "warfarin", "aspirin"}),
+}
+
+
+def _classify_specialties_local(keywords, top_k=3):
+    """
+    Score each specialty by how many of its indicative terms appear among
+    the extracted keyword tokens; return up to top_k matching specialties,
+    best first. Returns [] when nothing matches so callers can fall back
+    to the model.
+    """
+    tokens = set()
+    for kw in keywords:
+        tokens.update(kw.lower().split())
+    scored = []
+    for spec, terms in _SPECIALTY_TERMS.items():
+        score = len(tokens & terms)
+        if score:
+            scored.append((score, spec))
+    scored.sort(key=lambda s: (-s[0], s[1]))
+    return [spec for _, spec in scored[:top_k]]
+
+
+# precompiled automaton over the trigger tokens: one linear scan of the
+# lowercased document instead of a keywords x map double loop
+if ahocorasick is not None:
+    _SPEC_AC = ahocorasick.Automaton()
+    for _token, _specs in SPECIALTY_MAP.items():
+        _SPEC_AC.add_word(_token, _specs)
+    _SPEC_AC.make_automaton()
+else:
+    _SPEC_AC = None
+
+
+@functools.lru_cache(maxsize=128)
+def _cached_extract_keywords(doc_text: str) -> tuple:
+    return tuple(extract_keywords(doc_text))
+
+
+def _event_human_ts(ev: Dict[str, Any]) -> str:
+    # MemoryBank stamps _human_ts at append time; fall back to formatting
+    # the raw timestamp for events written before that
+    human_ts = ev.get("_human_ts")
+    if human_ts:
+        return human_ts
+    ts = ev.get("timestamp") or ev.get("recorded_at") or ev.get("time") or ""
+    try:
+        return time.strftime("%Y-%m-%d %H:%M", time.localtime(float(ts)))
+    except Exception:
+        return str(ts)
+
+
+def _fmt_adherence_event(ev: Dict[str, Any]) -> str:
+    med = ev.get("med") or ev.get("med_name") or ""
+    return f"- Took {med} at {_event_human_ts(ev)}"
+
+
+def _fmt_uploaded_doc(ev: Dict[str, Any]) -> str:
+    meds = ", ".join(ev.get("keywords", [])[:6])
+    specs = ", ".join(ev.get("suggested_specialties", []))
+    return f"- Uploaded doc keywords: {meds}. Suggested: {specs}"
+
+
+def _fmt_doctor_advice(ev: Dict[str, Any]) -> str:
+    return f"- Doctor {ev.get('doctor_id', 'doctor')} advised: {ev.get('advice_text', '')}"
+
+
+def _fmt_default_event(ev: Dict[str, Any]) -> str:
+    return f"- {ev.get('type', 'event')}: {str(ev)[:120]}"
+
+
+# event type -> bullet formatter, replacing the per-event if/elif chain
+_SUMMARY_HANDLERS = {
+    "adherence_event": _fmt_adherence_event,
+    "uploaded_doc_summary": _fmt_uploaded_doc,
+    "doctor_advice": _fmt_doctor_advice,
+}
+
+
+class ConversationalAgent:
+    def __init__(self, memory: Optional[MemoryBank] = None, logger: Optional[JSONLogger] = None):
+        # Config / environment
+        self.GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+        # endpoint base (no trailing /models), we'll append model path
+        self.GEMINI_ENDPOINT = os.getenv("GEMINI_ENDPOINT", "https://generativelanguage.googleapis.com/v1beta")
+        self.GEMINI_MODEL = os.getenv("GEMINI_MODEL", "models/gemini-2.5-pro")
+
+        # runtime helpers
+        self.memory = memory or MemoryBank("memory/memory_bank.jsonl")
+        self.logger = logger
+
+        # reuse one HTTP session (keep-alive) and precompute URL/headers so
+        # each call_gemini avoids a fresh TCP+TLS handshake
+        self._gemini_url = f"{self.GEMINI_ENDPOINT.rstrip('/')}/{self.GEMINI_MODEL}:generateContent"
+        self._session = requests.Session()
+        self._session.headers.update({
+            "Content-Type": "application/json",
+            "x-goog-api-key": self.GEMINI_API_KEY or ""
+        })
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+        # cache of (prompt digest, max tokens, temperature) -> model output
+        self._gemini_cache: Dict[Any, str] = {}
+
+    # -----------------------
+    # Gemini API wrapper
+    # -----------------------
+    def call_gemini(self, prompt: str, max_output_tokens: int = DEFAULT_MAX_OUTPUT_TOKENS, temperature: float = 0.2) -> str:
+        """
+        Call Gemini generateContent for configured model.
+        Returns a string (model output) or a deterministic fallback message on error.
+
+        Identical low-temperature prompts (reminder templates, specialty
+        prompts over the same keywords) are served from an in-process cache
+        to skip the repeat network round-trip.
+        """
+        cacheable = temperature <= 0.3
+        if cacheable:
+            key = (hashlib.blake2b(prompt.encode()).digest(), max_output_tokens, round(temperature, 2))
+            cached = self._gemini_cache.get(key)
+            if cached is not None:
+                return cached
+        out = self._call_gemini_uncached(prompt, max_output_tokens, temperature)
+        # don't cache error/sentinel fallbacks; a retry should hit the network
+        if cacheable and not out.startswith(("SIMULATED MODEL RESPONSE", "MODEL_TRUNCATED")):
+            if len(self._gemini_cache) >= GEMINI_CACHE_MAX:
+                self._gemini_cache.clear()
+            self._gemini_cache[key] = out
+        return out
+
+    def _call_gemini_uncached(self, prompt: str, max_output_tokens: int, temperature: float) -> str:
+        if not self.GEMINI_API_KEY:
+            return "SIMULATED MODEL RESPONSE: " + (prompt[:200] + "...")
+
+        payload = {
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": {
+                "temperature": temperature,
+                "maxOutputTokens": max_output_tokens,
+                "candidateCount": 1
+            }
+        }
+
+        try:
+            resp = self._session.post(self._gemini_url, json=payload, timeout=60)
+        except Exception as e:
+            if self.logger:
+                self.logger.error({"agent": "convo", "action": "call_gemini_request_failed", "error": str(e)})
+            return "SIMULATED MODEL RESPONSE (request error)."
+
+        # parse response safely
+        body_json = None
+        body_text = ""
+        try:
+            body_json = resp.json()
+        except Exception:
+            body_text = resp.text or ""
+
+        if self.logger:
+            self.logger.info({
+                "agent": "convo",
+                "action": "call_gemini_response",
+                "status": resp.status_code,
+                "body": str(body_json)[:4000] if body_json else body_text[:2000]
+            })
+
+        if resp.status_code != 200 or not body_json:
+            if self.logger:
+                self.logger.error({
+                    "agent": "convo",
+                    "action": "call_gemini_non200",
+                    "status": resp.status_code,
+                    "body": str(body_json)[:2000] if body_json else body_text[:2000]
+                })
+            return "SIMULATED MODEL RESPONSE (API error). See logs."
+
+        # helper to extract model text from the less common response shapes
+        def extract_text(d: Dict[str, Any]) -> Optional[str]:
+            try:
+                candidates = d.get("candidates") or []
+                if candidates:
+                    c0 = candidates[0]
+                    content = c0.get("content") or {}
+                    parts = content.get("parts") or []
+                    if parts:
+                        first = parts[0]
+                        if isinstance(first, str):
+                            return first
+                    if isinstance(c0.get("output"), str):
+                        return c0.get("output")
+                if "output_text" in d and isinstance(d["output_text"], str):
+                    return d["output_text"]
+                if "messages" in d:
+                    texts = []
+                    for m in d.get("messages", []):
+                        for c in (m.get("content") or []):
+                            if isinstance(c, dict) and "text" in c:
+                                texts.append(c["text"])
+                    if texts:
+                        return "\n".join(texts)
+            except Exception:
+                return None
+            return None
+
+        # bind the first candidate once; reused by the truncation check below
+        try:
+            cand0 = (body_json.get("candidates") or [None])[0]
+        except Exception:
+            cand0 = None
+
+        # fast path: the canonical generateContent shape, one guarded chain
+        # of lookups instead of the generic .get() walk
+        try:
+            out = cand0["content"]["parts"][0]["text"]
+        except (KeyError, IndexError, TypeError):
+            out = extract_text(body_json)
+
+        # detect truncation metadata (finishReason == MAX_TOKENS)
+        try:
+            if cand0 and isinstance(cand0, dict) and cand0.get("finishReason") == "MAX_TOKENS":
+                if out:
+                    return out + "\n\n---\n(Note: model truncated by MAX_TOKENS; consider raising max_output_tokens)"
+                else:
+                    if self.logger:
+                        self.logger.info({"agent": "convo", "action": "model_truncated_candidate", "candidate": json.dumps(cand0)[:2000]})
+                    return "MODEL_TRUNCATED: Increase max_output_tokens. Partial candidate logged."
+        except Exception:
+            pass
+
+        if out:
+            return out
+
+        if self.logger:
+            self.logger.error({"agent": "convo", "action": "call_gemini_unparseable", "body": str(body_json)[:2000]})
+        return "SIMULATED MODEL RESPONSE (unparseable). See logs."
+
+    # -----------------------
+    # Memory helpers
+    # -----------------------
+    def search_memory(self, user_id: str, query: str, max_results: int = 10) -> List[Dict[str, Any]]:
+        """
+        Very simple keyword search across JSON-serializable events.
+        Returns matches (newest first) where any token appears in the JSON string of the event.
+        """
+        events = self.memory.get_user_memory(user_id)
+        if not events:
+            return []
+        q_tokens = [t.lower() for t in _WORD_RE.findall(query) if len(t) > 2][:10]
+        if not q_tokens:
+            return []
+        # cached lowercased text per event; avoids re-serializing every event
+        texts = self.memory.get_user_search_text(user_id)
+        matches: List[Dict[str, Any]] = []
+        if ahocorasick is not None and len(q_tokens) > 2:
+            # single automaton pass per event instead of one substring scan
+            # per token; not worth the build cost for 1-2 tokens
+            automaton = ahocorasick.Automaton()
+            for t in q_tokens:
+                automaton.add_word(t, t)
+            automaton.make_automaton()
+            for ev, s in zip(reversed(events), reversed(texts)):  # newest first
+                if next(automaton.iter(s), None) is not None:
+                    matches.append(ev)
+                    if len(matches) >= max_results:
+                        break
+            return matches
+        for ev, s in zip(reversed(events), reversed(texts)):  # newest first
+            for t in q_tokens:
+                if t in s:
+                    matches.append(ev)
+                    break
+            if len(matches) >= max_results:
+                break
+        return matches
+
+    def summarize_events(self, events: List[Dict[str, Any]], concise: bool = True) -> str:
+        """
+        Local summarization of events into readable bullets. If many events and concise=False,
+        optionally call model to compress further.
+        """
+        if not events:
+            return ""
+        bullets = [_SUMMARY_HANDLERS.get(ev.get("type"), _fmt_default_event)(ev) for ev in events]
+
+        summary = "\n".join(bullets[:20])
+        if len(bullets) > 20 and not concise:
+            # ask model to compress into 3 lines
+            prompt = "Summarize these patient events into 3 concise lines:\n\n" + summary
+            model_out = self.call_gemini(prompt, max_output_tokens=200)
+            return model_out or summary
+        return summary
+
+    # -----------------------
+    # Memory-first responder
+    # -----------------------
+    def respond_with_memory_first(self, user_id: str, query: str) -> str:
+        """
+        1) Search memory for matches to the query
+        2) If matches exist, return a short local summary and offer to expand
+        3) If none found, call Gemini directly
+        """
+        if self.logger:
+            self.logger.info({"agent": "convo", "action": "respond_with_memory_first", "user": user_id, "query": query})
+        matches = self.search_memory(user_id, query, max_results=8)
+        if matches:
+            summary = self.summarize_events(matches, concise=True)
+            if not summary.strip():
+                if self.logger:
+                    self.logger.info({"agent": "convo", "action": "empty_summary_fallback"})
+                return self.call_gemini(query)
+            return f"I found these saved notes related to your question:\n\n{summary}\n\nIf you want more details I can expand or ask the model to interpret these."
+        # nothing in memory
+        return self.call_gemini(query)
+
+    # -----------------------
+    # App features
+    # -----------------------
+    def send_reminder_and_record(self, user_id: str, event: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Sends a reminder prompt to the model, simulates user reply (demo), and logs adherence event.
+        event keys: 'med' or 'med_name', optionally 'dose'/'dosage', 'time', 'frequency'
+        """
+        med = event.get("med") or event.get("med_name") or "medication"
+        dose = event.get("dose") or event.get("dosage") or ""
+        prompt = f"Reminder: It's time to take {med} {dose}. Ask the user to confirm 'Did you take {med}?' and handle yes/no."
+        if self.logger:
+            self.logger.info({"agent": "convo", "action": "send_reminder", "user": user_id, "med": med})
+        model_resp = self.call_gemini(prompt)
+        # Demo: simulate user confirming
+        user_reply = "Yes, I took it."
+        timestamp = time.time()
+        entry = {
+            "type": "adherence_event",
+            "user_id": user_id,
+            "med": med,
+            "dose": dose,
+            "timestamp": timestamp,
+            "user_reply": user_reply,
+            "recorded_at": timestamp
+        }
+        self.memory.append_user_event(user_id, entry)
+        return {"model_response": model_resp, "user_reply": user_reply, "saved": True}
+
+    def handle_uploaded_document(self, user_id: str, doc_text: str) -> List[str]:
+        """
+        Process uploaded prescription/medical record text, extract keywords/conditions,
+        recommend specialties. Robust to model errors/truncation.
+        """
+        # demos/tests re-upload the same prescription; memoize extraction
+        keywords = list(_cached_extract_keywords(doc_text))
+
+        suggested = set()
+        # rule-based matching first
+        if _SPEC_AC is not None:
+            # single pass over the raw document text
+            for _, specs in _SPEC_AC.iter(doc_text.lower()):
+                suggested.update(specs)
+        else:
+            # lower each keyword once, not once per map entry
+            lowered_keywords = [kw.lower() for kw in keywords]
+            for lk in lowered_keywords:
+                for token, specs in SPECIALTY_MAP.items():
+                    if token in lk:
+                        suggested.update(specs)
+
+        if not suggested:
+            # local classifier first: score specialties by token affinity so
+            # the common fallback case never leaves the process
+            local = _classify_specialties_local(keywords)
+            if local:
+                if self.logger:
+                    self.logger.info({"agent": "convo", "action": "local_specialty_match", "user": user_id, "specialties": local})
+                suggested.update(local)
+
+        if not suggested:
+            # last resort: ask the model to infer specialties
+            prompt = f"Given these extracted keywords from a medical record: {keywords[:20]}, suggest likely medical specialties a patient should visit."
+            model_suggestions = self.call_gemini(prompt, max_output_tokens=200)
+
+            # defensive checks for sentinel/error messages
+            ms_text = str(model_suggestions or "")
+            if not ms_text.strip() or any(sig in ms_text.upper() for sig in ("MODEL_TRUNCATED", "SIMULATED MODEL RESPONSE", "API ERROR", "UNPARSEABLE")):
+                if self.logger:
+                    self.logger.info({"agent": "convo", "action": "handle_uploaded_document_fallback", "user": user_id, "model_resp": ms_text[:500]})
+                suggested.update(["Primary Care", "Internal Medicine"])
+            else:
+                # parse sensible items by splitting common separators
+                parts = [p.strip() for p in _SPLIT_RE.split(ms_text) if len(p.strip()) > 2]
+                for p in parts[:6]:
+                    suggested.add(p)
+
+        summary_entry = {
+            "type": "uploaded_doc_summary",
+            "user_id": user_id,
+            "keywords": keywords,
+            "suggested_specialties": list(suggested),
+            "raw_excerpt": doc_text[:500],
+            "recorded_at": time.time()
+        }
+        self.memory.append_user_event(user_id, summary_entry)
+
+        if self.logger:
+            self.logger.info({"agent": "convo", "action": "doc_processed", "user": user_id, "specialties": list(suggested)})
+
+        return list(suggested)
+
+    def doctor_add_advice(self, user_id: str, doctor_id: str, advice_text: str, related_specialties: Optional[List[str]] = None) -> bool:
+        """
+        Doctor mode: add an advice note to patient memory.
+        """
+        note = {
+            "type": "doctor_advice",
+            "user_id": user_id,
+            "doctor_id": doctor_id,
+            "advice_text": advice_text,
+            "related_specialties": related_specialties or [],
+            "timestamp": time.time(),
+            "recorded_at": time.time()
+        }
+        self.memory.append_user_event(user_id, note)
+        if self.logger:
+            self.logger.info({"agent": "convo", "action": "doctor_add_advice", "user": user_id, "doctor_id": doctor_id})
+        return True
+
+    # convenience getter
+    def get_recent_adherence(self, user_id: str, n: int = 5) -> List[Dict[str, Any]]:
+        evs = self.memory.get_user_memory(user_id)
+        # walk newest-first and stop after n hits instead of copying/filtering
+        # the whole history
+        return list(islice((e for e in reversed(evs) if e.get("type") == "adherence_event"), n))
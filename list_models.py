@@ -1,31 +1,66 @@
-# list_models.py
-import os, requests, json
-from dotenv import load_dotenv
-load_dotenv()
-
-API_KEY = os.getenv("GEMINI_API_KEY")
-ENDPOINT = os.getenv("GEMINI_ENDPOINT", "https://generativelanguage.googleapis.com/v1beta/models")
-
-if not API_KEY:
-    print("No GEMINI_API_KEY in .env")
-    raise SystemExit(1)
-
-url = f"{ENDPOINT}?key={API_KEY}"
-print("Calling ListModels:", url)
-r = requests.get(url, timeout=15)
-print("HTTP", r.status_code)
-try:
-    data = r.json()
-    print(json.dumps(data, indent=2)[:4000])  # print first chunk
-    # If there is a 'models' list, print names
-    if isinstance(data, dict):
-        for k in ("models","model","availableModels"):
-            if k in data and isinstance(data[k], list):
-                print("\nModel names:")
-                for m in data[k]:
-                    if isinstance(m, dict) and "name" in m:
-                        print(" -", m["name"])
-                break
-except Exception as e:
-    print("Failed to parse response:", e)
-    print("Raw body:", r.text[:2000])
+# list_models.py
+import os, requests, json
+from dotenv import load_dotenv
+load_dotenv()
+
+try:
+    import ijson  # optional: stream model names without a full parse
+except ImportError:
+    ijson = None
+
+API_KEY = os.getenv("GEMINI_API_KEY")
+ENDPOINT = os.getenv("GEMINI_ENDPOINT", "https://generativelanguage.googleapis.com/v1beta/models")
+# set LIST_MODELS_DEBUG=1 to dump the raw response body instead of just names
+DEBUG = os.getenv("LIST_MODELS_DEBUG") == "1"
+
+if not API_KEY:
+    print("No GEMINI_API_KEY in .env")
+    raise SystemExit(1)
+
+url = f"{ENDPOINT}?key={API_KEY}"
+print("Calling ListModels:", url)
+
+if ijson is not None and not DEBUG:
+    # pull only models[*].name out of the stream; the rest of the payload
+    # is never deserialized
+    r = requests.get(url, stream=True, timeout=15)
+    print("HTTP", r.status_code)
+    # urllib3 hands back the wire bytes by default; ask it to gunzip so
+    # ijson sees JSON, not a compressed stream
+    r.raw.decode_content = True
+    try:
+        count = 0
+        for name in ijson.items(r.raw, "models.item.name"):
+            if count == 0:
+                print("\nModel names:")
+            print(" -", name)
+            count += 1
+        if count:
+            raise SystemExit(0)
+        # no "models" list in the stream; the full parse below also knows
+        # the "model"/"availableModels" shapes
+        print("No streamed model names; retrying with a full parse")
+    except SystemExit:
+        raise
+    except Exception as e:
+        # fall through to the non-streaming full parse below
+        print("Failed to stream response:", e)
+
+r = requests.get(url, timeout=15)
+print("HTTP", r.status_code)
+try:
+    data = r.json()
+    if DEBUG:
+        print(json.dumps(data, indent=2)[:4000])  # print first chunk
+    # If there is a 'models' list, print names
+    if isinstance(data, dict):
+        for k in ("models","model","availableModels"):
+            if k in data and isinstance(data[k], list):
+                print("\nModel names:")
+                for m in data[k]:
+                    if isinstance(m, dict) and "name" in m:
+                        print(" -", m["name"])
+                break
+except Exception as e:
+    print("Failed to parse response:", e)
+    print("Raw body:", r.text[:2000])
@@ -1,23 +1,55 @@
-# logs/json_logger.py
-"""
-Simple structured JSON logger that appends one JSON object per line.
-"""
-
-import json
-import time
-import os
-
-class JSONLogger:
-    def __init__(self, filepath="logs/logs.jsonl"):
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        self.filepath = filepath
-
-    def info(self, obj):
-        self._write({"level":"info","ts": time.time(), **obj})
-
-    def error(self, obj):
-        self._write({"level":"error","ts": time.time(), **obj})
-
-    def _write(self, o):
-        with open(self.filepath, "a") as f:
-            f.write(json.dumps(o) + "\n")
+# logs/json_logger.py
+"""
+Simple structured JSON logger that appends one JSON object per line.
+
+The log file is kept open for the lifetime of the logger (append mode,
+64 KiB buffer) so each record is one buffered write instead of an
+open/write/close round-trip. Buffered records are flushed at exit.
+"""
+
+import atexit
+import json
+import threading
+import time
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# directories already created by a logger in this process; skips the
+# stat/mkdir syscalls when several loggers share a log dir
+_ENSURED_DIRS = set()
+
+class JSONLogger:
+    def __init__(self, filepath="logs/logs.jsonl"):
+        dirpath = os.path.dirname(filepath)
+        if dirpath not in _ENSURED_DIRS:
+            os.makedirs(dirpath, exist_ok=True)
+            _ENSURED_DIRS.add(dirpath)
+        self.filepath = filepath
+        self._fh = open(self.filepath, "a", buffering=1 << 16)
+        self._lock = threading.Lock()  # callers may log from worker threads
+        atexit.register(self.flush)
+
+    def info(self, obj):
+        self._write({"level":"info","ts": time.time(), **obj})
+
+    def error(self, obj):
+        self._write({"level":"error","ts": time.time(), **obj})
+
+    def flush(self):
+        with self._lock:
+            if not self._fh.closed:
+                self._fh.flush()
+
+    def _write(self, o):
+        if orjson is not None:
+            line = orjson.dumps(o).decode() + "\n"
+        else:
+            # compact separators: the padding spaces are pure encoder and
+            # disk cost on a machine-read JSONL file
+            line = json.dumps(o, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._fh.write(line)
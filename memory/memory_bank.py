@@ -1,82 +1,307 @@
-# memory/memory_bank.py
-"""
-Simple file-backed MemoryBank that stores events per user.
-Each append writes to disk (append-only) and in-memory index is kept for quick access.
-"""
-
-import json
-import os
-import time
-
-class MemoryBank:
-    def __init__(self, path="memory/memory_bank.json"):
-        self.path = path
-        os.makedirs(os.path.dirname(self.path), exist_ok=True)
-        if not os.path.exists(self.path):
-            with open(self.path, "w") as f:
-                json.dump({}, f)
-        self._load()
-
-    def _load(self):
-        with open(self.path, "r") as f:
-            try:
-                self.store = json.load(f)
-            except Exception:
-                self.store = {}
-
-    def _save(self):
-        with open(self.path, "w") as f:
-            json.dump(self.store, f, indent=2)
-
-    def append_user_event(self, user_id, event):
-        self.store.setdefault(user_id, [])
-        event = dict(event)
-        event.setdefault("recorded_at", time.time())
-        self.store[user_id].append(event)
-        self._save()
-
-    def get_user_memory(self, user_id):
-        return self.store.get(user_id, [])
-
-    def get_user_events(self, user_id):
-        """
-        Return a list of events for the given user_id.
-        Works even if the JSON file structure changes in the future.
-        """
-        try:
-            # load fresh from disk
-            with open(self.path, "r") as f:
-                raw = f.read().strip()
-                if not raw:
-                    return []
-
-                data = json.loads(raw)
-
-            # Case A: normal dict {user_id: [events]}
-            if isinstance(data, dict) and user_id in data and isinstance(data[user_id], list):
-                return data[user_id]
-
-            # Case B: flat list of events
-            if isinstance(data, list):
-                return [e for e in data if isinstance(e, dict) and e.get("user_id") == user_id]
-
-            # Case C: nested dict lists
-            results = []
-            if isinstance(data, dict):
-                for v in data.values():
-                    if isinstance(v, list):
-                        for e in v:
-                            if isinstance(e, dict) and e.get("user_id") == user_id:
-                                results.append(e)
-            return results
-
-        except Exception:
-            return []
-
-
-    def clear_user_memory(self, user_id):
-        if user_id in self.store:
-            del self.store[user_id]
-            self._save()
-            return True
-        return False
+# memory/memory_bank.py
+"""
+Simple file-backed MemoryBank that stores events per user.
+Events are persisted to an append-only JSONL log (one event per line), so
+each append costs O(event) instead of rewriting the whole store; the
+in-memory per-user index is kept for quick access and compact() rewrites
+the log from it. A legacy whole-store .json snapshot is migrated on first
+load.
+"""
+
+import atexit
+import json
+import mmap
+import os
+import sys
+import threading
+import time
+
+try:
+    import msgspec.json as _msgspec_json
+    # instantiated once; reused Encoder/Decoder skip per-call setup
+    _msg_enc = _msgspec_json.Encoder()
+    _msg_dec = _msgspec_json.Decoder()
+except ImportError:
+    _msg_enc = None
+    _msg_dec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+    _simd_parser = simdjson.Parser()  # reused; avoids per-parse allocation
+except ImportError:
+    _simd_parser = None
+
+# flush the append buffer once either bound is hit
+MAX_PENDING_EVENTS = 64
+MAX_PENDING_BYTES = 64 * 1024
+
+class MemoryBank:
+    def __init__(self, path="memory/memory_bank.jsonl"):
+        self.path = path
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._fh = None  # append handle, opened on first write
+        self._pending = []  # serialized lines awaiting one group write
+        self._pending_bytes = 0
+        self._write_lock = threading.Lock()  # callers may append from worker threads
+        self._load()
+        atexit.register(self.flush)
+
+    def _load(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        self.store = {}
+        # lowercased searchable text per event, built lazily per user
+        self._search_text = {}
+        if not os.path.exists(self.path):
+            # migrate a legacy whole-store JSON snapshot if one is present
+            legacy = os.path.splitext(self.path)[0] + ".json"
+            if os.path.exists(legacy):
+                try:
+                    with open(legacy, "rb") as f:
+                        data = _loads(f.read())
+                    self.store = _migrate_legacy(data)
+                    self.compact()
+                except Exception:
+                    self.store = {}
+            self._mtime_ns = self._stat_mtime_ns()
+            return
+        try:
+            with open(self.path, "rb") as f:
+                try:
+                    # map the log instead of read()ing it: the kernel pages
+                    # bytes in on demand and no full-file copy is made
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (ValueError, OSError):  # empty file / mmap unavailable
+                    mm = None
+                if mm is not None:
+                    with mm:
+                        self._index_lines(iter(mm.readline, b""))
+                else:
+                    self._index_lines(f)
+        except Exception:
+            self.store = {}
+        self._mtime_ns = self._stat_mtime_ns()
+
+    def _index_lines(self, lines):
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                event = _loads(line)
+            except Exception:
+                continue
+            user_id = _intern_strings(event).get("user_id")
+            if user_id is not None:
+                self.store.setdefault(user_id, []).append(event)
+
+    def _stat_mtime_ns(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _maybe_reload(self):
+        # self.store is authoritative for in-process writes (including
+        # events still in the pending buffer), so the common case is one
+        # stat and no I/O; only re-parse when an external writer touched
+        # the file
+        mtime_ns = self._stat_mtime_ns()
+        if mtime_ns == self._mtime_ns:
+            return
+        # persist buffered appends before re-reading so they aren't lost
+        self.flush()
+        self._load()
+
+    def _append_line(self, line):
+        with self._write_lock:
+            self._pending.append(line)
+            self._pending_bytes += len(line)
+            if len(self._pending) >= MAX_PENDING_EVENTS or self._pending_bytes >= MAX_PENDING_BYTES:
+                self._flush_locked()
+
+    def flush(self):
+        """
+        Group-commit buffered events: one write plus one fsync for the
+        whole batch instead of per append. Registered with atexit and
+        called before any path that re-reads the log.
+        """
+        with self._write_lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        # caller holds _write_lock
+        if not self._pending:
+            return
+        if self._fh is None:
+            self._fh = open(self.path, "ab")
+        self._fh.write(b"".join(self._pending))
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._pending.clear()
+        self._pending_bytes = 0
+        self._mtime_ns = self._stat_mtime_ns()
+
+    def compact(self):
+        """
+        Atomically rewrite the log to one line per live event. Used after
+        destructive updates and to migrate a legacy snapshot.
+        """
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        # pending lines describe events already in self.store
+        self._pending.clear()
+        self._pending_bytes = 0
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            for events in self.store.values():
+                for event in events:
+                    f.write(_dumps_line(event))
+        os.replace(tmp, self.path)
+        self._mtime_ns = self._stat_mtime_ns()
+
+    def append_user_event(self, user_id, event):
+        """
+        Append one event. The bank takes ownership of the dict (it is
+        annotated in place rather than copied); pass a copy if the caller
+        needs to keep an untouched version.
+        """
+        if type(user_id) is str:
+            user_id = sys.intern(user_id)
+        self.store.setdefault(user_id, [])
+        event.setdefault("user_id", user_id)
+        event.setdefault("recorded_at", time.time())
+        # pre-format once so summaries don't strftime per event per query;
+        # callers may supply a non-numeric recorded_at, in which case the
+        # field is skipped and consumers fall back to formatting on read
+        recorded_at = event["recorded_at"]
+        if isinstance(recorded_at, (int, float)):
+            event.setdefault("_human_ts", time.strftime("%Y-%m-%d %H:%M", time.localtime(recorded_at)))
+        _intern_strings(event)
+        self.store[user_id].append(event)
+        if user_id in self._search_text:
+            self._search_text[user_id].append(_event_search_text(event))
+        self._append_line(_dumps_line(event))
+
+    def append_batch(self, user_id, events):
+        """
+        Append several events for one user; their log lines share group
+        writes through the pending buffer.
+        """
+        for event in events:
+            self.append_user_event(user_id, event)
+
+    def get_user_memory(self, user_id):
+        self._maybe_reload()
+        return self.store.get(user_id, [])
+
+    def get_user_search_text(self, user_id):
+        """
+        Lowercased searchable text per event, aligned with get_user_memory.
+        Built once per user and extended on append, so keyword searches do
+        not re-serialize every event on every query.
+        """
+        texts = self._search_text.get(user_id)
+        events = self.store.get(user_id, [])
+        if texts is None or len(texts) != len(events):
+            texts = [_event_search_text(ev) for ev in events]
+            self._search_text[user_id] = texts
+        return texts
+
+    def get_user_events(self, user_id):
+        """
+        Return a list of events for the given user_id. Served from the
+        in-memory index; the log is only re-parsed when an external writer
+        modified it (detected via mtime).
+        """
+        self._maybe_reload()
+        return self.store.get(user_id, [])
+
+    def debug_dump_pretty(self, path=None):
+        """
+        Write a one-shot indented JSON snapshot of the store for human
+        inspection. The log itself stays compact JSONL; pretty-printing
+        on the write path would double serialize cost.
+        """
+        path = path or os.path.splitext(self.path)[0] + ".pretty.json"
+        with open(path, "w") as f:
+            json.dump(self.store, f, indent=2)
+        return path
+
+    def clear_user_memory(self, user_id):
+        if user_id in self.store:
+            del self.store[user_id]
+            self._search_text.pop(user_id, None)
+            self.compact()
+            return True
+        return False
+
+
+# fields repeated verbatim across many events; interning keeps one copy
+# per distinct value and makes dict lookups on them pointer compares
+_INTERN_FIELDS = ("user_id", "type", "med", "med_name")
+
+
+def _intern_strings(event):
+    for field in _INTERN_FIELDS:
+        value = event.get(field)
+        if type(value) is str:
+            event[field] = sys.intern(value)
+    return event
+
+
+def _migrate_legacy(data):
+    """
+    One-time conversion of the legacy snapshot shapes into the per-user
+    dict: {user_id: [events]}, a flat event list, or nested dict lists
+    keyed by something other than user_id.
+    """
+    store = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if not isinstance(value, list):
+                continue
+            for ev in value:
+                if not isinstance(ev, dict):
+                    continue
+                user_id = ev.get("user_id", key)
+                store.setdefault(user_id, []).append({"user_id": user_id, **ev})
+    elif isinstance(data, list):
+        for ev in data:
+            if isinstance(ev, dict) and ev.get("user_id") is not None:
+                store.setdefault(ev["user_id"], []).append(ev)
+    return store
+
+
+def _loads(data):
+    if _msg_dec is not None:
+        return _msg_dec.decode(data)
+    if orjson is not None:
+        return orjson.loads(data)
+    if _simd_parser is not None:
+        parsed = _simd_parser.parse(data)
+        # materialize: the parser's buffer is reused by the next parse
+        return parsed.as_dict() if hasattr(parsed, "as_dict") else parsed
+    return json.loads(data)
+
+
+def _dumps_line(event):
+    if _msg_enc is not None:
+        return _msg_enc.encode(event) + b"\n"
+    if orjson is not None:
+        return orjson.dumps(event) + b"\n"
+    return (json.dumps(event, separators=(",", ":")) + "\n").encode()
+
+
+def _event_search_text(event):
+    try:
+        return json.dumps(event, separators=(",", ":")).lower()
+    except Exception:
+        return str(event).lower()
@@ -1,26 +1,39 @@
-# tools/medcheck_tool.py
-"""
-Simple simulated medication-check tool.
-Flags same-time dosing conflicts and a few hard-coded drug interactions.
-"""
-
-def medcheck(meds):
-    """
-    meds: list of dicts with keys 'name' and optional 'time' (HH:MM)
-    returns: list of flags
-    """
-    times = {}
-    flags = []
-    names = [m["name"] for m in meds]
-    for m in meds:
-        t = m.get("time", "00:00")
-        times.setdefault(t, []).append(m["name"])
-    for t, names_at_time in times.items():
-        if len(names_at_time) > 1:
-            flags.append({"type":"timing_conflict","time":t,"meds":names_at_time})
-    # basic interaction rules
-    if "Warfarin" in names and "Aspirin" in names:
-        flags.append({"type":"interaction","pair":["Warfarin","Aspirin"],"severity":"high","note":"Bleeding risk"})
-    if "Metformin" in names and "Contrast" in names:
-        flags.append({"type":"interaction","pair":["Metformin","Contrast"],"severity":"moderate","note":"Consider holding Metformin around contrast imaging"})
-    return flags
+# tools/medcheck_tool.py
+"""
+Simple simulated medication-check tool.
+Flags same-time dosing conflicts and a few table-driven drug interactions.
+"""
+
+from collections import defaultdict
+
+# interaction rules: lowercase med pair (set for O(1) subset checks) ->
+# flag template; add new rules here instead of growing an if-ladder in
+# medcheck
+_INTERACTIONS = [
+    (frozenset({"warfarin", "aspirin"}),
+     {"type": "interaction", "pair": ["Warfarin", "Aspirin"], "severity": "high", "note": "Bleeding risk"}),
+    (frozenset({"metformin", "contrast"}),
+     {"type": "interaction", "pair": ["Metformin", "Contrast"], "severity": "moderate", "note": "Consider holding Metformin around contrast imaging"}),
+]
+
+def medcheck(meds):
+    """
+    meds: list of dicts with keys 'name' and optional 'time' (HH:MM)
+    returns: list of flags
+    """
+    times = defaultdict(list)
+    # normalize once so "warfarin"/"ASPIRIN" still match the rules
+    names_set = frozenset(m["name"].strip().lower() for m in meds)
+    for m in meds:
+        times[m.get("time", "00:00")].append(m["name"])
+    flags = [
+        {"type": "timing_conflict", "time": t, "meds": names_at_time}
+        for t, names_at_time in times.items()
+        if len(names_at_time) > 1
+    ]
+    for pair, flag in _INTERACTIONS:
+        if pair <= names_set:
+            # copy the pair list too so callers mutating a flag cannot
+            # reach back into the shared template
+            flags.append({**flag, "pair": list(flag["pair"])})
+    return flags